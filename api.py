@@ -0,0 +1,397 @@
+# api.py
+
+import json
+from contextlib import contextmanager
+from datetime import date
+from typing import Optional
+
+import typer
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+
+from db import get_db, get_read_db, reader_session
+from models import User, Entry, Goal, MealPlan, MealPlanDay, MealPlanItem, Reporting
+from mealplans import DAYS, create_structured_plan
+from usercache import user_exists, user_id_for_name, invalidate_user, cache_info
+import queries
+
+app = FastAPI(title="Health Simplified API")
+
+# Upper bound on entries returned by one page of GET /entries
+MAX_PAGE_SIZE = 10000
+
+
+def user_etag(db: Session, user_id: int, resource: str):
+    """
+    ETag for RESOURCE of USER_ID, built from the user's data_version.
+
+    Triggers bump the version in the same transaction as every write to the
+    user's rows, whether it comes from the API or from cli.py. The version is
+    read before the data it covers, so a body can only be newer than its tag;
+    a client holding such a tag just gets a full response next time. Raises
+    404 if there is no such user.
+    """
+    version = queries.user_version(db, user_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail=f"No user with id={user_id}")
+    return f'W/"{user_id}-{version}-{resource}"'
+
+
+def opaque_tag(tag: str):
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(request: Request, etag: str):
+    """
+    Returns a 304 response if the client already holds ETAG, otherwise None.
+
+    If-None-Match uses weak comparison: a W/ prefix on either side is
+    ignored, and "*" matches any current representation.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    tags = {opaque_tag(tag.strip()) for tag in if_none_match.split(",")}
+    if "*" in tags or opaque_tag(etag) in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def cached_json(content, etag: str):
+    return JSONResponse(content=content, headers={"ETag": etag})
+
+
+def require_user(db: Session, user_id: int):
+    if not user_exists(db, user_id):
+        raise HTTPException(status_code=404, detail=f"No user with id={user_id}")
+
+
+@contextmanager
+def write_for_user(db: Session, user_id: int):
+    """
+    Run a write for USER_ID and commit it. The existence check before it may
+    have come from the cache; if another process deleted the user since, the
+    foreign key fails and this answers 404 as the check would have.
+    """
+    try:
+        yield
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        invalidate_user(user_id)
+        raise HTTPException(status_code=404, detail=f"No user with id={user_id}")
+
+
+@app.exception_handler(OperationalError)
+def database_busy(request: Request, exc: OperationalError):
+    """
+    Surface "database is locked" as a retryable 503 instead of a 500.
+    """
+    if "locked" in str(exc):
+        return JSONResponse(status_code=503, content={"detail": "Database is busy, retry."},
+                            headers={"Retry-After": "1"})
+    return JSONResponse(status_code=500, content={"detail": "Database error."})
+
+
+@app.get("/debug/cache")
+def user_cache_stats():
+    """
+    Hit/miss counters of this process's user lookup cache.
+    """
+    return cache_info()._asdict()
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Request bodies
+# ────────────────────────────────────────────────────────────────────────────────
+
+class UserIn(BaseModel):
+    name: str
+
+
+class EntryIn(BaseModel):
+    user_id: int
+    food: str
+    calories: int
+    date: date
+
+
+class GoalIn(BaseModel):
+    user_id: int
+    daily: int
+    weekly: int
+
+
+class MealPlanIn(BaseModel):
+    user_id: int
+    week: int
+    plan_details: str
+
+
+class ReportIn(BaseModel):
+    user_id: int
+    date: date
+
+
+def entry_dict(e):
+    return {"id": e.id, "user_id": e.user_id, "food": e.food, "calories": e.calories, "date": e.date.isoformat()}
+
+
+def report_dict(r):
+    return {"id": r.id, "user_id": r.user_id, "report_date": r.report_date.isoformat(),
+            "total_calories": r.total_calories}
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Users
+# ────────────────────────────────────────────────────────────────────────────────
+
+@app.get("/users")
+def list_users(db: Session = Depends(get_read_db)):
+    return [{"id": u.id, "name": u.name} for u in db.query(User.id, User.name).order_by(User.id)]
+
+
+@app.get("/users/by-name/{name}")
+def get_user_by_name(name: str, db: Session = Depends(get_read_db)):
+    user_id = user_id_for_name(db, name)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail=f"No user named '{name}'")
+    return {"id": user_id, "name": name}
+
+
+@app.post("/users", status_code=201)
+def create_user(body: UserIn, db: Session = Depends(get_db)):
+    existing_id = user_id_for_name(db, body.name, cached=False)
+    if existing_id is not None:
+        raise HTTPException(status_code=409, detail=f"A user named '{body.name}' already exists (id={existing_id}).")
+    user = User(name=body.name)
+    db.add(user)
+    db.commit()
+    invalidate_user(user.id, user.name)
+    return {"id": user.id, "name": user.name}
+
+
+@app.delete("/users/{user_id}", status_code=204)
+def delete_user(user_id: int, db: Session = Depends(get_db)):
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail=f"No user found with id={user_id}")
+    db.delete(user)
+    db.commit()
+    invalidate_user(user_id, user.name)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Entries
+# ────────────────────────────────────────────────────────────────────────────────
+
+@app.get("/entries")
+def list_entries(
+    user_id: Optional[int] = None,
+    date: Optional[date] = None,
+    after_id: int = Query(0, ge=0, description="Return entries with id greater than this"),
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Stream one page of entries as JSON, ordered by id.
+
+    The body ends with "next_after_id", the cursor for the following page
+    (null on the last page). Rows are fetched and written in batches, so a
+    large page never sits in memory as a whole.
+    """
+    def stream():
+        db = reader_session()
+        try:
+            query = db.query(Entry.id, Entry.user_id, Entry.food, Entry.calories, Entry.date)
+            if user_id is not None:
+                query = query.filter(Entry.user_id == user_id)
+            if date is not None:
+                query = query.filter(Entry.date == date)
+            query = query.filter(Entry.id > after_id).order_by(Entry.id).limit(limit)
+
+            yield '{"entries": ['
+            count, last_id = 0, None
+            for row in query.yield_per(500):
+                yield ("," if count else "") + json.dumps(entry_dict(row))
+                count, last_id = count + 1, row.id
+            next_after_id = last_id if count == limit else None
+            yield f'], "next_after_id": {json.dumps(next_after_id)}}}'
+        finally:
+            db.close()
+
+    return StreamingResponse(stream(), media_type="application/json")
+
+
+@app.post("/entries", status_code=201)
+def add_entry(body: EntryIn, db: Session = Depends(get_db)):
+    require_user(db, body.user_id)
+    with write_for_user(db, body.user_id):
+        entry_id = queries.add_entry(db, body.user_id, body.food, body.calories, body.date)
+    return {"id": entry_id, "user_id": body.user_id, "food": body.food, "calories": body.calories,
+            "date": body.date.isoformat()}
+
+
+@app.delete("/entries/{entry_id}", status_code=204)
+def delete_entry(entry_id: int, db: Session = Depends(get_db)):
+    if queries.delete_entry(db, entry_id) is None:
+        raise HTTPException(status_code=404, detail=f"No entry found with id={entry_id}")
+    db.commit()
+
+
+@app.get("/users/{user_id}/totals/{day}")
+def daily_total(user_id: int, day: date, request: Request, db: Session = Depends(get_read_db)):
+    etag = user_etag(db, user_id, f"total-{day.isoformat()}")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    total = queries.daily_total(db, user_id, day)
+    return cached_json({"user_id": user_id, "date": day.isoformat(), "total_calories": total}, etag)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Goals
+# ────────────────────────────────────────────────────────────────────────────────
+
+@app.get("/users/{user_id}/goals")
+def list_goals(user_id: int, request: Request, db: Session = Depends(get_read_db)):
+    etag = user_etag(db, user_id, "goals")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    goals = db.query(Goal).filter(Goal.user_id == user_id).all()
+    return cached_json([{"id": g.id, "daily": g.daily, "weekly": g.weekly} for g in goals], etag)
+
+
+@app.post("/goals", status_code=201)
+def create_goal(body: GoalIn, db: Session = Depends(get_db)):
+    require_user(db, body.user_id)
+    if db.query(Goal.id).filter(Goal.user_id == body.user_id).first():
+        raise HTTPException(status_code=409, detail="User already has a goal. Delete it first if you want to update.")
+    goal = Goal(user_id=body.user_id, daily=body.daily, weekly=body.weekly)
+    with write_for_user(db, body.user_id):
+        db.add(goal)
+    return {"id": goal.id, "user_id": goal.user_id, "daily": goal.daily, "weekly": goal.weekly}
+
+
+@app.delete("/goals/{goal_id}", status_code=204)
+def delete_goal(goal_id: int, db: Session = Depends(get_db)):
+    goal = db.query(Goal).filter(Goal.id == goal_id).first()
+    if not goal:
+        raise HTTPException(status_code=404, detail=f"No goal found with id={goal_id}")
+    db.delete(goal)
+    db.commit()
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Meal plans
+# ────────────────────────────────────────────────────────────────────────────────
+
+@app.get("/users/{user_id}/mealplans/{week}")
+def show_mealplan(user_id: int, week: int, request: Request, db: Session = Depends(get_read_db)):
+    etag = user_etag(db, user_id, f"mealplan-{week}")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    items = (
+        db.query(MealPlanItem)
+          .filter(MealPlanItem.user_id == user_id, MealPlanItem.week == week)
+          .order_by(MealPlanItem.day_of_week, MealPlanItem.id)
+          .all()
+    )
+    if not items:
+        texts = [
+            details for (details,) in
+            db.query(MealPlan.plan_details)
+              .filter(MealPlan.user_id == user_id, MealPlan.week == week, MealPlan.text_only.is_(True))
+              .order_by(MealPlan.id)
+              .all()
+        ]
+        if not texts:
+            raise HTTPException(status_code=404, detail=f"No meal plan found for user {user_id} in week {week}")
+        return cached_json({"user_id": user_id, "week": week, "text_only": True, "plan_details": texts}, etag)
+    totals = dict(
+        db.query(MealPlanDay.day_of_week, func.sum(MealPlanDay.total_calories))
+          .filter(MealPlanDay.user_id == user_id, MealPlanDay.week == week)
+          .group_by(MealPlanDay.day_of_week)
+          .all()
+    )
+    days = [{"day": day, "total_calories": totals.get(n, 0), "meals": []} for n, day in enumerate(DAYS)]
+    for item in items:
+        days[item.day_of_week]["meals"].append({"meal": item.meal, "food": item.food, "calories": item.calories})
+    return cached_json(
+        {"user_id": user_id, "week": week, "total_calories": sum(totals.values()), "days": days}, etag
+    )
+
+
+@app.post("/mealplans", status_code=201)
+def add_meal_plan(body: MealPlanIn, db: Session = Depends(get_db)):
+    require_user(db, body.user_id)
+    with write_for_user(db, body.user_id):
+        meal_plan = create_structured_plan(db, body.user_id, body.week, body.plan_details)
+    return {"id": meal_plan.id, "user_id": meal_plan.user_id, "week": meal_plan.week,
+            "meals": len(meal_plan.items), "total_calories": meal_plan.total_calories,
+            "text_only": meal_plan.text_only}
+
+
+@app.delete("/mealplans/{meal_plan_id}", status_code=204)
+def delete_meal_plan(meal_plan_id: int, db: Session = Depends(get_db)):
+    meal_plan = db.query(MealPlan).filter(MealPlan.id == meal_plan_id).first()
+    if not meal_plan:
+        raise HTTPException(status_code=404, detail=f"No meal plan found with id={meal_plan_id}")
+    db.delete(meal_plan)
+    db.commit()
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Reports
+# ────────────────────────────────────────────────────────────────────────────────
+
+@app.get("/users/{user_id}/reports")
+def list_reports(user_id: int, request: Request, db: Session = Depends(get_read_db)):
+    etag = user_etag(db, user_id, "reports")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    reports = db.query(Reporting).filter(Reporting.user_id == user_id).order_by(Reporting.report_date).all()
+    return cached_json([report_dict(r) for r in reports], etag)
+
+
+@app.post("/reports")
+def create_report(body: ReportIn, response: Response, db: Session = Depends(get_db)):
+    """
+    Create the daily report for a user, or return the existing one (200).
+    """
+    require_user(db, body.user_id)
+    existing = queries.report_for_day(db, body.user_id, body.date)
+    if existing:
+        return {"id": existing.id, "user_id": body.user_id, "report_date": body.date.isoformat(),
+                "total_calories": existing.total_calories}
+
+    reader = reader_session()
+    total_calories = queries.daily_total(reader, body.user_id, body.date)
+    reader.close()
+
+    with write_for_user(db, body.user_id):
+        report_id = queries.add_report(db, body.user_id, body.date, total_calories)
+    response.status_code = 201
+    return {"id": report_id, "user_id": body.user_id, "report_date": body.date.isoformat(),
+            "total_calories": total_calories}
+
+
+def main(
+    host: str = typer.Option("127.0.0.1", help="Interface to listen on"),
+    port: int = typer.Option(8000, help="Port to listen on"),
+):
+    """
+    Serve the API with uvicorn.
+    """
+    import uvicorn
+    uvicorn.run(app, host=host, port=port)
+
+
+if __name__ == "__main__":
+    typer.run(main)
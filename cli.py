@@ -4,22 +4,41 @@ import typer
 from typing import Optional
 from datetime import datetime
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 
-from db import SessionLocal, engine
-from models import Base, User, Entry, Goal, MealPlan, Reporting, ShowMeals
+from db import SessionLocal, engine, read_only, reader_session
+from models import User, Entry, Goal, MealPlan, MealPlanDay, MealPlanItem, Reporting, ShowMeals
+from mealplans import DAYS, create_structured_plan, planned_vs_actual, migrate_schema, migrate_plan_details
+from usercache import user_exists, user_id_for_name, invalidate_user
+import queries
 
 app = typer.Typer(help="Health Simplified CLI Application")
 
 
+def missing_user(db, user_id):
+    """
+    Handle a write that failed its foreign key because USER_ID was deleted
+    by another process after this one cached it: drop the stale cache entry
+    and exit as the existence check would have.
+    """
+    db.rollback()
+    db.close()
+    invalidate_user(user_id)
+    typer.echo(f"❌ No user with id={user_id}")
+    raise typer.Exit(code=1)
+
+
 @app.command("init-db")
 def init_db():
     """
-    Create all tables in the database. Run this once before any other commands.
+    Create all tables in the database, or bring an existing one up to date.
+    Run this once before any other commands, and again after upgrading.
     """
-    Base.metadata.create_all(bind=engine)
-    typer.echo("✅ Database tables created.")
+    migrate_schema(engine)
+    typer.echo("✅ Database tables created or brought up to date.")
 
 @app.command("show-mealplan")
+@read_only
 def show_mealplan(
     user_id: int = typer.Option(..., "--user-id", "-u", help="ID of the user"),
     week:    int = typer.Option(..., "--week",    "-w", help="Week number of the plan"),
@@ -29,30 +48,99 @@ def show_mealplan(
     for a given user_id and week.
     """
     db = SessionLocal()
-    usr = db.query(User).filter(User.id == user_id).first()
-    if not usr:
+    if not user_exists(db, user_id):
         typer.echo(f"❌ No user found with id={user_id}")
         db.close()
         raise typer.Exit(code=1)
 
-    rows = (
-        db.query(ShowMealPlan)
-          .filter(ShowMealPlan.user_id == user_id, ShowMealPlan.week == week)
-          .order_by(ShowMealPlan.week, ShowMealPlan.day_of_week)
+    items = (
+        db.query(MealPlanItem)
+          .filter(MealPlanItem.user_id == user_id, MealPlanItem.week == week)
+          .order_by(MealPlanItem.day_of_week, MealPlanItem.id)
           .all()
     )
-    if not rows:
-        typer.echo(f"⚠️  No meal plan found for user {user_id} in week {week}")
+    if not items:
+        texts = [
+            details for (details,) in
+            db.query(MealPlan.plan_details)
+              .filter(MealPlan.user_id == user_id, MealPlan.week == week, MealPlan.text_only.is_(True))
+              .order_by(MealPlan.id)
+              .all()
+        ]
         db.close()
+        if not texts:
+            typer.echo(f"⚠️  No meal plan found for user {user_id} in week {week}")
+            return
+        typer.echo(f"Meal Plan (user {user_id}, week {week}), stored as text:")
+        for details in texts:
+            typer.echo(f"  {details}")
         return
 
-    data = {
-        "Day of Week": [r.day_of_week for r in rows],
-        "Meals":       [r.meals for r in rows],
-    }
-    df = pd.DataFrame(data)
+    totals = dict(
+        db.query(MealPlanDay.day_of_week, func.sum(MealPlanDay.total_calories))
+          .filter(MealPlanDay.user_id == user_id, MealPlanDay.week == week)
+          .group_by(MealPlanDay.day_of_week)
+          .all()
+    )
+    meals = {n: [] for n in range(7)}
+    for item in items:
+        meals[item.day_of_week].append(f"{item.meal}: {item.food} ({item.calories})")
     db.close()
-    typer.echo("Meal Plan:")
+
+    typer.echo(f"Meal Plan (user {user_id}, week {week}):")
+    typer.echo(f"{'Day':<10} {'kcal':>6}  Meals")
+    for n, day in enumerate(DAYS):
+        typer.echo(f"{day:<10} {totals.get(n, 0):>6}  {', '.join(meals[n]) or '-'}")
+    typer.echo(f"{'Total':<10} {sum(totals.values()):>6}")
+
+
+@app.command("compare-mealplan")
+@read_only
+def compare_mealplan(
+    user_id: int = typer.Option(..., "--user-id", "-u", help="ID of the user"),
+    week:    int = typer.Option(..., "--week",    "-w", help="Week number of the plan"),
+    year:    Optional[int] = typer.Option(None, "--year", "-y", help="ISO year of the week (default: this year)"),
+):
+    """
+    Compare planned calories with logged entries for each day of a week.
+    """
+    db = SessionLocal()
+    if not user_exists(db, user_id):
+        typer.echo(f"❌ No user found with id={user_id}")
+        db.close()
+        raise typer.Exit(code=1)
+
+    year = year or datetime.now().isocalendar()[0]
+    try:
+        rows = planned_vs_actual(db, user_id, week, year)
+    except ValueError:
+        typer.echo(f"❌ Invalid week {week} for year {year}.")
+        db.close()
+        raise typer.Exit(code=1)
+    db.close()
+
+    typer.echo(f"Plan vs actual (user {user_id}, week {week} of {year}):")
+    typer.echo(f"{'Day':<10} {'Date':<10} {'Planned':>8} {'Actual':>8} {'Diff':>8}")
+    for day, day_date, planned, actual in rows:
+        typer.echo(f"{day:<10} {day_date} {planned:>8} {actual:>8} {actual - planned:>+8}")
+    planned_total = sum(r[2] for r in rows)
+    actual_total = sum(r[3] for r in rows)
+    typer.echo(f"{'Total':<21} {planned_total:>8} {actual_total:>8} {actual_total - planned_total:>+8}")
+
+
+@app.command("migrate-mealplans")
+def migrate_mealplans():
+    """
+    Upgrade an existing database (new tables, missing indexes, structured meal
+    plans) and parse old plan text.
+    """
+    migrate_schema(engine)
+    db = SessionLocal()
+    migrated, unparsed = migrate_plan_details(db)
+    db.close()
+    typer.echo(f"✅ Migrated {migrated} meal plan(s).")
+    if unparsed:
+        typer.echo(f"⚠️  {unparsed} meal plan(s) had no recognisable days and were left as text.")
 
 
 @app.command("create-user")
@@ -62,9 +150,9 @@ def create_user(name: str):
     """
     db = SessionLocal()
     # Check for existing name to avoid duplicates (optional)
-    existing = db.query(User).filter(User.name == name).first()
-    if existing:
-        typer.echo(f"❌ A user named '{name}' already exists (id={existing.id}).")
+    existing_id = user_id_for_name(db, name, cached=False)
+    if existing_id is not None:
+        typer.echo(f"❌ A user named '{name}' already exists (id={existing_id}).")
         db.close()
         raise typer.Exit(code=1)
 
@@ -72,11 +160,13 @@ def create_user(name: str):
     db.add(user)
     db.commit()
     db.refresh(user)
+    invalidate_user(user.id, user.name)
     typer.echo(f"👍 Created user: {user.name}  (id={user.id})")
     db.close()
 
 
 @app.command("list-users")
+@read_only
 def list_users():
     """
     List all users in the database.
@@ -109,24 +199,26 @@ def add_entry(
         raise typer.Exit(code=1)
 
     db = SessionLocal()
-    usr = db.query(User).filter(User.id == user_id).first()
-    if not usr:
+    if not user_exists(db, user_id):
         typer.echo(f"❌ No user with id={user_id}")
         db.close()
         raise typer.Exit(code=1)
 
-    entry = Entry(user_id=user_id, food=food, calories=calories, date=parsed_date)
-    db.add(entry)
-    db.commit()
-    db.refresh(entry)
+    try:
+        entry_id = queries.add_entry(db, user_id, food, calories, parsed_date)
+        db.commit()
+    except IntegrityError:
+        # Deleted by another process since it was cached
+        missing_user(db, user_id)
     typer.echo(
-        f"🍽️  Added entry: id={entry.id}, user_id={user_id}, "
+        f"🍽️  Added entry: id={entry_id}, user_id={user_id}, "
         f"{food} ({calories} kcal) on {parsed_date}"
     )
     db.close()
 
 
 @app.command("list-entries")
+@read_only
 def list_entries(
     user_id: Optional[int] = typer.Option(None, help="Filter by user_id"),
     date: Optional[str] = typer.Option(None, help="Filter by date YYYY-MM-DD"),
@@ -168,12 +260,10 @@ def delete_entry(entry_id: int):
     Delete a food entry by ENTRY_ID.
     """
     db = SessionLocal()
-    entry = db.query(Entry).filter(Entry.id == entry_id).first()
-    if not entry:
+    if queries.delete_entry(db, entry_id) is None:
         typer.echo(f"❌ No entry found with id={entry_id}")
         db.close()
         raise typer.Exit(code=1)
-    db.delete(entry)
     db.commit()
     typer.echo(f"🗑️ Deleted entry with id={entry_id}")
     db.close()
@@ -192,6 +282,7 @@ def delete_user(user_id: int):
         raise typer.Exit(code=1)
     db.delete(user)
     db.commit()
+    invalidate_user(user_id, user.name)
     typer.echo(f"🗑️ Deleted user with id={user_id} and related data.")
     db.close()
 
@@ -208,8 +299,7 @@ def create_goal(
     db = SessionLocal()
 
     # Check if the user exists
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if not user_exists(db, user_id):
         typer.echo(f"❌ No user with id={user_id}")
         db.close()
         raise typer.Exit(code=1)
@@ -223,7 +313,10 @@ def create_goal(
 
     goal = Goal(user_id=user_id, daily=daily, weekly=weekly)
     db.add(goal)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        missing_user(db, user_id)
     db.refresh(goal)
     typer.echo(
         f"🎯 Added goal: id={goal.id}, user_id={user_id}, daily={daily} kcal, weekly={weekly} kcal"
@@ -254,7 +347,6 @@ def delete_meal_plan(meal_plan_id: int):
     """
     Delete a meal plan by MEAL_PLAN_ID.
     """
-    from models import MealPlan  # Import here to avoid circular import if needed
     db = SessionLocal()
     meal_plan = db.query(MealPlan).filter(MealPlan.id == meal_plan_id).first()
     if not meal_plan:
@@ -270,29 +362,32 @@ def delete_meal_plan(meal_plan_id: int):
 def add_meal_plan(
     user_id: int,
     week: int,
-    plan_details: str = typer.Argument(..., help="Meal plan details"),
+    plan_details: str = typer.Argument(..., help='Meal plan details, e.g. "Mon: breakfast=Oatmeal 350; lunch=Salad 400  Tue: ..."'),
 ):
     """
     Add a meal plan for a given USER_ID and WEEK.
     """
-    from models import MealPlan  # Import here to avoid circular import if needed
     db = SessionLocal()
 
     # Check if the user exists
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if not user_exists(db, user_id):
         typer.echo(f"❌ No user with id={user_id}")
         db.close()
         raise typer.Exit(code=1)
 
-    meal_plan = MealPlan(user_id=user_id, week=week, plan_details=plan_details)
-    db.add(meal_plan)
-    db.commit()
+    meal_plan = create_structured_plan(db, user_id, week, plan_details)
+    try:
+        db.commit()
+    except IntegrityError:
+        missing_user(db, user_id)
     db.refresh(meal_plan)
     typer.echo(
         f"🍽️  Added meal plan: id={meal_plan.id}, user_id={user_id}, "
-        f"week={week}, details='{plan_details or 'N/A'}'"
+        f"week={week}, details='{plan_details or 'N/A'}', "
+        f"{len(meal_plan.items)} meals, {meal_plan.total_calories} kcal planned"
     )
+    if meal_plan.text_only:
+        typer.echo('⚠️  No day markers such as "Mon:" found; the plan is stored as text only.')
     db.close()
 
 # ────────────────────────────────────────────────────────────────────────────────
@@ -326,9 +421,6 @@ def create_report(
     """
     Create a daily report for a user by calculating total calories for the date.
     """
-    from models import Reporting  # Avoid circular import
-    from sqlalchemy import func  # Needed for sum
-
     db = SessionLocal()
 
     # Validate the date
@@ -340,17 +432,13 @@ def create_report(
         raise typer.Exit(code=1)
 
     # Check if the user exists
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if not user_exists(db, user_id):
         typer.echo(f"❌ No user found with id={user_id}")
         db.close()
         raise typer.Exit(code=1)
 
     # Check if report already exists
-    existing_report = db.query(Reporting).filter(
-        Reporting.user_id == user_id,
-        Reporting.report_date == report_date
-    ).first()
+    existing_report = queries.report_for_day(db, user_id, report_date)
 
     if existing_report:
         typer.echo(
@@ -360,24 +448,18 @@ def create_report(
         db.close()
         return
 
-    # Calculate total calories for this date
-    total_calories = db.query(func.sum(Entry.calories)).filter(
-        Entry.user_id == user_id,
-        Entry.date == report_date
-    ).scalar()
-
-    # If no entries found, total_calories will be None
-    total_calories = total_calories or 0
+    # Calculate total calories for this date on a reader so the aggregate
+    # doesn't hold up other writers (0 if no entries were logged)
+    reader = reader_session()
+    total_calories = queries.daily_total(reader, user_id, report_date)
+    reader.close()
 
     # Create the report entry
-    report = Reporting(
-        user_id=user_id,
-        report_date=report_date,
-        total_calories=total_calories
-    )
-    db.add(report)
-    db.commit()
-    db.refresh(report)
+    try:
+        queries.add_report(db, user_id, report_date, total_calories)
+        db.commit()
+    except IntegrityError:
+        missing_user(db, user_id)
 
     typer.echo("✅ Report created successfully:")
     typer.echo(f"  - User ID: {user_id}")
@@ -385,6 +467,74 @@ def create_report(
     typer.echo(f"  - Total Calories: {total_calories}")
     db.close()
 
+# ────────────────────────────────────────────────────────────────────────────────
+# Export
+# ────────────────────────────────────────────────────────────────────────────────
+
+@app.command("export")
+@read_only
+def export(
+    out_dir: str = typer.Argument(..., help="Directory to write the export into"),
+    tables: list[str] = typer.Option(
+        ["entries", "reporting", "goals", "meal_plans"], "--table", "-t", help="Table to export (repeatable)"
+    ),
+    fmt: str = typer.Option("parquet", "--format", "-f", help="parquet or arrow (Arrow IPC file)"),
+    partition_by: str = typer.Option("none", "--partition-by", "-p", help="none, user or month"),
+    compression: str = typer.Option("zstd", help="zstd, snappy, gzip, lz4 or none"),
+    after_id: Optional[int] = typer.Option(None, help="Only rows with id greater than this (incremental export of a single --table)"),
+    since: Optional[str] = typer.Option(None, help="Only rows dated on/after YYYY-MM-DD (entries, reporting)"),
+    batch_size: int = typer.Option(65536, help="Rows fetched and written per record batch"),
+):
+    """
+    Export tables to Parquet or Arrow IPC files, streamed in record batches.
+    """
+    from export import TABLES, FORMATS, PARTITIONS, COMPRESSIONS, export_table
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        typer.echo("❌ Exporting needs pyarrow. Install it with: pip install pyarrow")
+        raise typer.Exit(code=1)
+
+    for value, allowed, label in (
+        (fmt, FORMATS, "format"), (partition_by, PARTITIONS, "partition"), (compression, COMPRESSIONS, "compression"),
+    ):
+        if value not in allowed:
+            typer.echo(f"❌ Unknown {label} '{value}'. Choose from: {', '.join(allowed)}")
+            raise typer.Exit(code=1)
+    unknown = [t for t in tables if t not in TABLES]
+    if unknown:
+        typer.echo(f"❌ Unknown table(s): {', '.join(unknown)}. Choose from: {', '.join(TABLES)}")
+        raise typer.Exit(code=1)
+
+    if after_id is not None and len(tables) != 1:
+        typer.echo("❌ --after-id is a row id of one table; pass exactly one --table with it.")
+        raise typer.Exit(code=1)
+
+    since_date = None
+    if since is not None:
+        try:
+            since_date = datetime.strptime(since, "%Y-%m-%d").date()
+        except ValueError:
+            typer.echo("❌ Invalid date format. Use YYYY-MM-DD.")
+            raise typer.Exit(code=1)
+
+    for table in tables:
+        table_partition = partition_by
+        if partition_by == "month" and not TABLES[table][2]:
+            typer.echo(f"⚠️  {table} has no date column; partitioning it by user instead of month.")
+            table_partition = "user"
+        try:
+            rows, max_id, files = export_table(
+                table, out_dir, fmt=fmt, partition_by=table_partition, compression=compression,
+                after_id=after_id, since=since_date, batch_size=batch_size,
+            )
+        except ValueError as exc:
+            typer.echo(f"❌ {exc}")
+            raise typer.Exit(code=1)
+        typer.echo(f"📦 {table}: {rows} rows in {len(files)} file(s)"
+                   + (f", next --after-id {max_id}" if max_id is not None else ""))
+
 
 if __name__ == "__main__":
     app()
@@ -1,21 +1,114 @@
-from sqlalchemy import create_engine
+from sqlalchemy import URL, create_engine, event
 from sqlalchemy.orm import sessionmaker
+from contextvars import ContextVar
+from functools import wraps
+from urllib.parse import quote
 import os
 
 # We'll use SQLite for now, storing the DB file as health.db in the project root.
-DB_FILENAME = "health.db"
+# HEALTH_DB points at a different file (the load tester uses a scratch copy).
+DB_FILENAME = os.getenv("HEALTH_DB", "health.db")
 DB_URL = f"sqlite:///{DB_FILENAME}"
+# Readers open the same file read-only; in WAL mode each read transaction sees
+# a consistent snapshot and never blocks (or is blocked by) the writer.
+# Built as a URL object: SQLAlchemy would unquote a URL string before SQLite
+# parses it, turning "%23" back into a "#" that cuts the path short.
+READ_DB_URL = URL.create(
+    "sqlite", database=f"file:{quote(os.path.abspath(DB_FILENAME))}", query={"mode": "ro", "uri": "true"}
+)
 
-# Create SQLAlchemy engine and session factory
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
+# Set HEALTH_DB_READ_SPLIT=0 to send everything through the writer (the old behaviour).
+READ_SPLIT = os.getenv("HEALTH_DB_READ_SPLIT", "1") != "0"
+
+# Set HEALTH_DB_WAL=0 to leave the journal mode alone. Otherwise the writer
+# switches the file to WAL with synchronous=NORMAL: commits no longer wait for
+# an fsync, so an OS crash or power loss can drop the last few commits (the
+# file stays consistent; an application crash loses nothing). WAL is stored
+# in the file, so turning this off does not switch an existing file back.
+WAL = os.getenv("HEALTH_DB_WAL", "1") != "0"
+
+# Seconds a connection waits inside SQLite for a lock before raising
+# "database is locked" (pysqlite's default is 5). The load tester sets 0 so
+# every wait happens in its own retry loop, where it can be timed.
+BUSY_TIMEOUT = float(os.getenv("HEALTH_DB_BUSY_TIMEOUT", "5"))
+
+# Create SQLAlchemy engines and session factories
+connect_args = {"check_same_thread": False, "timeout": BUSY_TIMEOUT}
+engine = create_engine(DB_URL, connect_args=connect_args)
+read_engine = create_engine(READ_DB_URL, connect_args=connect_args)
+
+
+@event.listens_for(engine, "connect")
+def _configure_writer(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # Writes for a user deleted by another process fail here rather than
+    # leaving orphan rows, so the existence checks before them can be cached.
+    cursor.execute("PRAGMA foreign_keys=ON")
+    if WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+@event.listens_for(read_engine, "connect")
+def _configure_reader(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+WriterSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReaderSession = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+_read_only = ContextVar("read_only", default=False)
+
+
+def read_only(func):
+    """
+    Mark a command as non-mutating: SessionLocal() inside it returns reader sessions.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _read_only.set(True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
+
+
+def SessionLocal():
+    """
+    Returns a reader session inside a @read_only command, otherwise a writer session.
+    """
+    if READ_SPLIT and _read_only.get():
+        return ReaderSession()
+    return WriterSession()
+
+
+def reader_session():
+    """
+    Returns a session for reads that don't need to see the caller's uncommitted writes.
+    """
+    return ReaderSession() if READ_SPLIT else WriterSession()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
     """
     Yields a new SQLAlchemy Session and ensures it's closed after use.
     """
-    db = SessionLocal()
+    db = WriterSession()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db():
+    """
+    Yields a new read-only SQLAlchemy Session and ensures it's closed after use.
+    """
+    db = reader_session()
     try:
         yield db
     finally:
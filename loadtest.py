@@ -0,0 +1,517 @@
+# loadtest.py
+
+import os
+import sys
+import json
+import time
+import random
+import http.client
+import multiprocessing
+from urllib.parse import urlsplit
+from datetime import date, timedelta
+from typing import Optional
+
+import typer
+
+app = typer.Typer(help="Concurrent load generator for the Health Simplified database")
+
+OPERATIONS = ("add-entry", "list-entries", "show-mealplan", "daily-total", "create-report", "delete-entry")
+DEFAULT_MIX = "add-entry=50,list-entries=15,show-mealplan=10,daily-total=10,create-report=10,delete-entry=5"
+FOODS = ("Salad", "Oatmeal", "Chicken", "Rice", "Apple", "Pasta", "Yogurt")
+# Every load user gets this plan, read back by show-mealplan
+PLAN_WEEK = 1
+SEED_PLAN = "Mon: breakfast=Oatmeal 350; lunch=Salad 400  Wed: dinner=Pasta 700"
+# Page size for list-entries in HTTP mode
+MAX_HTTP_PAGE = 1000
+
+
+def parse_mix(mix: str):
+    """
+    Parse "op=weight,op=weight" into a {op: weight} dict.
+    """
+    weights = {}
+    for part in mix.split(","):
+        if not part.strip():
+            continue
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPERATIONS:
+            raise typer.BadParameter(f"Unknown operation '{op}'. Choose from: {', '.join(OPERATIONS)}")
+        weights[op] = float(weight or 1)
+    if not weights:
+        raise typer.BadParameter("Operation mix is empty.")
+    return weights
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def is_locked_error(exc):
+    return "database is locked" in str(exc) or "database table is locked" in str(exc)
+
+
+def prepare_database(db_path: str, users: int, seed_entries: int):
+    """
+    Start from an empty database file with USERS users and some entries each.
+    Returns the created user ids.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    from db import SessionLocal, engine
+    from models import Base, User, Entry
+    from mealplans import create_structured_plan
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user_ids = []
+    today = date.today()
+    for i in range(users):
+        user = User(name=f"load-user-{i}")
+        db.add(user)
+        db.flush()
+        user_ids.append(user.id)
+        db.add_all(
+            Entry(
+                user_id=user.id,
+                food=FOODS[n % len(FOODS)],
+                calories=100 + (n * 37) % 600,
+                date=today - timedelta(days=n % 30),
+            )
+            for n in range(seed_entries)
+        )
+        create_structured_plan(db, user.id, PLAN_WEEK, SEED_PLAN)
+    db.commit()
+    db.close()
+    engine.dispose()
+    return user_ids
+
+
+def prepare_http(url: str, users: int, seed_entries: int):
+    """
+    Create USERS fresh users with some entries each through the HTTP API.
+    Returns the created user ids.
+    """
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+
+    def post(path, body):
+        conn.request("POST", path, body=json.dumps(body), headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        data = json.loads(resp.read())
+        if resp.status >= 400:
+            raise typer.BadParameter(f"POST {path} failed with HTTP {resp.status}: {data}")
+        return data
+
+    run_id = int(time.time() * 1000)
+    today = date.today()
+    user_ids = []
+    for i in range(users):
+        user_id = post("/users", {"name": f"load-user-{run_id}-{i}"})["id"]
+        user_ids.append(user_id)
+        post("/mealplans", {"user_id": user_id, "week": PLAN_WEEK, "plan_details": SEED_PLAN})
+        for n in range(seed_entries):
+            post("/entries", {
+                "user_id": user_id,
+                "food": FOODS[n % len(FOODS)],
+                "calories": 100 + (n * 37) % 600,
+                "date": (today - timedelta(days=n % 30)).isoformat(),
+            })
+    conn.close()
+    return user_ids
+
+
+class RetryableError(Exception):
+    """
+    The database was locked; the operation can be retried.
+    """
+
+
+class OperationFailed(Exception):
+    """
+    The operation failed for a reason other than lock contention.
+    """
+
+
+def make_cli_caller(user_id, rng):
+    """
+    Operations that call the cli.py command functions directly, so they
+    exercise the same sessions and queries as the real commands.
+    """
+    sys.stdout = open(os.devnull, "w")
+    import cli
+    import queries
+    from db import SessionLocal, reader_session
+    from models import Entry
+    from sqlalchemy import func
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm import close_all_sessions
+
+    today = date.today()
+
+    def random_date():
+        return (today - timedelta(days=rng.randrange(30))).isoformat()
+
+    def latest_entry_id():
+        db = SessionLocal()
+        try:
+            return db.query(func.max(Entry.id)).filter(Entry.user_id == user_id).scalar()
+        finally:
+            db.close()
+
+    def run(op):
+        if op == "add-entry":
+            cli.add_entry(user_id, rng.choice(FOODS), rng.randrange(50, 900), random_date())
+        elif op == "list-entries":
+            cli.list_entries(user_id=user_id, date=None)
+        elif op == "show-mealplan":
+            cli.show_mealplan(user_id=user_id, week=PLAN_WEEK)
+        elif op == "daily-total":
+            # No command prints it; run the query GET /users/{id}/totals serves
+            db = reader_session()
+            try:
+                queries.daily_total(db, user_id, today)
+            finally:
+                db.close()
+        elif op == "create-report":
+            cli.create_report(user_id=user_id, date=random_date())
+        elif op == "delete-entry":
+            entry_id = latest_entry_id()
+            if entry_id is None:
+                op = "add-entry"
+                cli.add_entry(user_id, rng.choice(FOODS), rng.randrange(50, 900), random_date())
+            else:
+                cli.delete_entry(entry_id)
+        return op
+
+    def call(op):
+        try:
+            return run(op)
+        except OperationalError as exc:
+            # The command's session is left open when it raises; release its
+            # locks now rather than whenever it is garbage collected.
+            close_all_sessions()
+            if is_locked_error(exc):
+                raise RetryableError() from exc
+            raise OperationFailed(str(exc)) from exc
+        except typer.Exit as exc:
+            raise OperationFailed(f"{op} exited") from exc
+
+    return call
+
+
+def make_http_caller(url, user_id, rng, stats):
+    """
+    Operations sent to a running api.py over one kept-alive HTTP connection.
+
+    show-mealplan and daily-total re-send the ETag of their last response,
+    like a polling client would; STATS counts those requests and their 304s.
+    """
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+    today = date.today()
+    entry_ids = []
+    etags = {}
+
+    def random_date():
+        return (today - timedelta(days=rng.randrange(30))).isoformat()
+
+    def send(method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.HTTPException, OSError) as exc:
+            conn.close()
+            raise OperationFailed(f"{method} {path}: {exc}") from exc
+        if resp.status == 503:
+            raise RetryableError()
+        if resp.status >= 400:
+            raise OperationFailed(f"{method} {path}: HTTP {resp.status}")
+        return resp, data
+
+    def request(method, path, body=None):
+        _, data = send(method, path, body)
+        return json.loads(data) if data else None
+
+    def conditional_get(path):
+        etag = etags.get(path)
+        resp, _ = send("GET", path, headers={"If-None-Match": etag} if etag else None)
+        etags[path] = resp.getheader("ETag", etag)
+        if etag:
+            stats["conditional"] += 1
+            stats["not_modified"] += resp.status == 304
+
+    def add_entry():
+        entry = request("POST", "/entries", {
+            "user_id": user_id, "food": rng.choice(FOODS),
+            "calories": rng.randrange(50, 900), "date": random_date(),
+        })
+        entry_ids.append(entry["id"])
+
+    def call(op):
+        if op == "add-entry":
+            add_entry()
+        elif op == "list-entries":
+            request("GET", f"/entries?user_id={user_id}&limit={MAX_HTTP_PAGE}")
+        elif op == "show-mealplan":
+            conditional_get(f"/users/{user_id}/mealplans/{PLAN_WEEK}")
+        elif op == "daily-total":
+            conditional_get(f"/users/{user_id}/totals/{today.isoformat()}")
+        elif op == "create-report":
+            request("POST", "/reports", {"user_id": user_id, "date": random_date()})
+        elif op == "delete-entry":
+            if not entry_ids:
+                op = "add-entry"
+                add_entry()
+            else:
+                request("DELETE", f"/entries/{entry_ids.pop()}")
+        return op
+
+    return call
+
+
+def run_worker(worker_id, user_id, weights, rate, duration, max_retries, seed, url=None):
+    """
+    Run a random mix of operations for DURATION seconds and return raw timings.
+
+    Operations go through the cli.py command functions, or through the HTTP
+    API at URL when one is given.
+    """
+    rng = random.Random(seed)
+    ops = list(weights)
+    op_weights = [weights[op] for op in ops]
+    stats = {
+        "worker": worker_id,
+        "latencies": {op: [] for op in OPERATIONS},
+        "retries": 0,
+        "lock_wait": 0.0,
+        "errors": 0,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "cache_bypassed": 0,
+        "conditional": 0,
+        "not_modified": 0,
+    }
+    call = make_http_caller(url, user_id, rng, stats) if url else make_cli_caller(user_id, rng)
+    interval = 1.0 / rate if rate > 0 else 0.0
+    start = time.perf_counter()
+    deadline = start + duration
+    next_at = start
+
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        if interval:
+            if now < next_at:
+                time.sleep(next_at - now)
+            next_at += interval
+
+        op = rng.choices(ops, op_weights)[0]
+        began = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt_start = time.perf_counter()
+            try:
+                op = call(op)
+            except RetryableError:
+                if attempt >= max_retries:
+                    stats["errors"] += 1
+                    break
+                backoff = min(0.002 * (2 ** attempt), 0.1) * rng.uniform(0.5, 1.5)
+                time.sleep(backoff)
+                stats["retries"] += 1
+                # The failed attempt plus the backoff; with --busy-timeout 0 SQLite
+                # never sleeps on a lock itself, so this is the whole wait.
+                stats["lock_wait"] += time.perf_counter() - attempt_start
+                attempt += 1
+                continue
+            except OperationFailed:
+                stats["errors"] += 1
+                break
+            stats["latencies"][op].append(time.perf_counter() - began)
+            break
+
+    if not url:
+        from usercache import cache_info
+
+        info = cache_info()
+        stats["cache_hits"], stats["cache_misses"], stats["cache_bypassed"] = info.hits, info.misses, info.bypassed
+    return stats
+
+
+def _run_worker(args):
+    return run_worker(*args)
+
+
+def run_level(workers, user_ids, weights, rate, duration, max_retries, url=None):
+    """
+    Run one load level with WORKERS processes and aggregate their results.
+    """
+    per_worker_rate = rate / workers if rate > 0 else 0.0
+    jobs = [
+        (i, user_ids[i % len(user_ids)], weights, per_worker_rate, duration, max_retries, 1000 + i, url)
+        for i in range(workers)
+    ]
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes=workers) as pool:
+        results = pool.map(_run_worker, jobs)
+
+    per_op = {op: [] for op in OPERATIONS}
+    for r in results:
+        for op, values in r["latencies"].items():
+            per_op[op].extend(values)
+    all_latencies = sorted(v for values in per_op.values() for v in values)
+    return {
+        "workers": workers,
+        "ops": len(all_latencies),
+        "throughput": len(all_latencies) / duration,
+        "p50": percentile(all_latencies, 50),
+        "p95": percentile(all_latencies, 95),
+        "p99": percentile(all_latencies, 99),
+        "per_op": {op: sorted(values) for op, values in per_op.items() if values},
+        "retries": sum(r["retries"] for r in results),
+        "lock_wait": sum(r["lock_wait"] for r in results),
+        "errors": sum(r["errors"] for r in results),
+        "cache_hits": sum(r["cache_hits"] for r in results),
+        "cache_misses": sum(r["cache_misses"] for r in results),
+        "cache_bypassed": sum(r["cache_bypassed"] for r in results),
+        "conditional": sum(r["conditional"] for r in results),
+        "not_modified": sum(r["not_modified"] for r in results),
+    }
+
+
+def server_cache_info(url):
+    """
+    Hit/miss counters of the user cache inside the api.py process at URL.
+    """
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+    try:
+        conn.request("GET", "/debug/cache")
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def format_row(level):
+    return (
+        f"{level['workers']:>7}  {level['throughput']:>9.1f}  "
+        f"{level['p50'] * 1000:>8.1f}  {level['p95'] * 1000:>8.1f}  {level['p99'] * 1000:>8.1f}  "
+        f"{level['retries']:>7}  {level['lock_wait']:>10.2f}  {level['errors']:>6}"
+    )
+
+
+def find_saturation(levels, min_gain=0.05):
+    """
+    Return the first level after which adding workers no longer raises
+    throughput by MIN_GAIN, or starts producing errors.
+    """
+    for prev, level in zip(levels, levels[1:]):
+        if level["errors"] > prev["errors"] or level["throughput"] < prev["throughput"] * (1 + min_gain):
+            return prev
+    return None
+
+
+@app.command()
+def main(
+    workers: str = typer.Option("1,2,4,8", "--workers", "-w", help="Comma-separated worker counts to sweep"),
+    duration: float = typer.Option(10.0, "--duration", "-d", help="Seconds to run each level"),
+    rate: float = typer.Option(0.0, "--rate", "-r", help="Target total ops/sec per level (0 = unthrottled)"),
+    mix: str = typer.Option(DEFAULT_MIX, "--mix", "-m", help="Operation weights as op=weight,..."),
+    users: int = typer.Option(8, help="Number of users to spread workers across"),
+    seed_entries: int = typer.Option(200, help="Entries created per user before each level"),
+    max_retries: int = typer.Option(20, help="Retries on 'database is locked' before counting an error"),
+    busy_timeout: float = typer.Option(
+        0.0, help="SQLite busy timeout in seconds for CLI workers; at 0 every lock wait is a timed retry "
+                  "(a running api.py uses its own HEALTH_DB_BUSY_TIMEOUT)"),
+    db_path: str = typer.Option("loadtest.db", "--db", help="Scratch database file (recreated per level)"),
+    csv: Optional[str] = typer.Option(None, help="Also write the capacity curve to this CSV file"),
+    read_split: bool = typer.Option(True, help="Route reads to read-only sessions (--no-read-split for the old single-session path)"),
+    wal: bool = typer.Option(True, help="Put the scratch database in WAL mode with synchronous=NORMAL (--no-wal keeps the rollback journal)"),
+    url: Optional[str] = typer.Option(None, help="Drive a running api.py at this URL instead of calling cli.py (--db is ignored)"),
+):
+    """
+    Sweep worker counts against one SQLite file and print a capacity curve.
+    """
+    weights = parse_mix(mix)
+    levels_to_run = [int(n) for n in workers.split(",") if n.strip()]
+    os.environ["HEALTH_DB"] = db_path
+    os.environ["HEALTH_DB_READ_SPLIT"] = "1" if read_split else "0"
+    os.environ["HEALTH_DB_WAL"] = "1" if wal else "0"
+    os.environ["HEALTH_DB_BUSY_TIMEOUT"] = str(busy_timeout)
+
+    typer.echo(f"Mix: {', '.join(f'{op}={w:g}' for op, w in weights.items())}  "
+               f"duration={duration:g}s rate={'max' if rate <= 0 else f'{rate:g}/s'} "
+               f"read-split={'on' if read_split else 'off'} wal={'on' if wal else 'off'} "
+               f"busy-timeout={busy_timeout:g}s target={url or 'cli'}")
+    typer.echo("workers     ops/s    p50 ms    p95 ms    p99 ms  retries  lockwait s  errors")
+
+    levels = []
+    for n in levels_to_run:
+        if url:
+            user_ids = prepare_http(url, users, seed_entries)
+        else:
+            user_ids = prepare_database(db_path, users, seed_entries)
+        if url:
+            before = server_cache_info(url)
+        level = run_level(n, user_ids, weights, rate, duration, max_retries, url)
+        if url:
+            # The server's counters are cumulative; keep only this level's share
+            after = server_cache_info(url)
+            level["cache_hits"] = after["hits"] - before["hits"]
+            level["cache_misses"] = after["misses"] - before["misses"]
+            level["cache_bypassed"] = after["bypassed"] - before["bypassed"]
+        levels.append(level)
+        typer.echo(format_row(level))
+        lookups = level["cache_hits"] + level["cache_misses"]
+        typer.echo(
+            f"{'':>7}  user cache     hits={level['cache_hits']} misses={level['cache_misses']} "
+            f"bypassed={level['cache_bypassed']}"
+            + (f" hit rate={level['cache_hits'] / lookups:.0%}" if lookups else "")
+        )
+        if url:
+            conditional = level["conditional"]
+            typer.echo(
+                f"{'':>7}  etags          conditional GETs={conditional} 304s={level['not_modified']}"
+                + (f" 304 rate={level['not_modified'] / conditional:.0%}" if conditional else "")
+            )
+        for op, values in level["per_op"].items():
+            typer.echo(
+                f"{'':>7}  {op:<14} n={len(values):<6} p50={percentile(values, 50) * 1000:.1f}ms "
+                f"p95={percentile(values, 95) * 1000:.1f}ms p99={percentile(values, 99) * 1000:.1f}ms"
+            )
+
+    saturated = find_saturation(levels)
+    if saturated:
+        typer.echo(f"Throughput saturates at {saturated['workers']} workers "
+                   f"(~{saturated['throughput']:.1f} ops/s).")
+    else:
+        typer.echo("No saturation point reached; try more workers.")
+
+    if csv:
+        with open(csv, "w") as f:
+            f.write("workers,throughput,p50_ms,p95_ms,p99_ms,retries,lock_wait_s,errors\n")
+            for level in levels:
+                f.write(
+                    f"{level['workers']},{level['throughput']:.2f},{level['p50'] * 1000:.2f},"
+                    f"{level['p95'] * 1000:.2f},{level['p99'] * 1000:.2f},{level['retries']},"
+                    f"{level['lock_wait']:.3f},{level['errors']}\n"
+                )
+        typer.echo(f"Capacity curve written to {csv}")
+
+
+if __name__ == "__main__":
+    app()
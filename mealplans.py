@@ -0,0 +1,204 @@
+# mealplans.py
+
+import re
+from datetime import date, timedelta
+
+from sqlalchemy import func, inspect, text
+
+from models import Entry, MealPlan, MealPlanDay, MealPlanItem, ShowMeals
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# "Mon:", "tuesday:", "SAT :" ... marks the start of a day's meals
+DAY_PATTERN = re.compile(r"\b(mon|tue|wed|thu|fri|sat|sun)[a-z]*\s*:", re.IGNORECASE)
+# "[meal=]food [(]calories [kcal][)]", e.g. "lunch=Chicken salad (450 kcal)" or "Apple 90".
+# Calories must follow a space or "(", so digits inside a name ("V8", "Eggs x2") stay in it.
+ITEM_PATTERN = re.compile(
+    r"^\s*(?:(?P<meal>[^=]+?)\s*=\s*)?(?P<food>.+?)"
+    r"(?:(?:\s+|\s*\()(?P<calories>\d+)\s*(?:kcal|cal|calories)?\s*\)?)?\s*$",
+    re.IGNORECASE,
+)
+
+
+def parse_plan_details(plan_details: str):
+    """
+    Parse free-text plan details into per-day/per-meal items.
+
+    The text is a list of days, each followed by its meals separated by ";"
+    or ",":  "Mon: breakfast=Oatmeal 350; lunch=Salad (400 kcal)  Tue: ...".
+    Calories are optional. Returns a list of dicts with day_of_week
+    (0 = Monday), meal, food and calories (None when not given); text
+    without any day markers yields an empty list.
+
+    >>> items = parse_plan_details("Mon: breakfast=Eggs x2; snack=V8; lunch=Salad (400 kcal)  Tue: Apple 90")
+    >>> [(item["food"], item["calories"]) for item in items]
+    [('Eggs x2', None), ('V8', None), ('Salad', 400), ('Apple', 90)]
+    >>> parse_plan_details("Oatmeal 350; Salad 400")
+    []
+    """
+    items = []
+    markers = list(DAY_PATTERN.finditer(plan_details or ""))
+    for i, marker in enumerate(markers):
+        day_of_week = [d[:3].lower() for d in DAYS].index(marker.group(1).lower())
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(plan_details)
+        segment = plan_details[marker.end():end]
+        for n, part in enumerate(p for p in re.split(r"[;,\n|]", segment) if p.strip()):
+            match = ITEM_PATTERN.match(part)
+            if not match:
+                continue
+            items.append({
+                "day_of_week": day_of_week,
+                "meal": (match.group("meal") or f"meal {n + 1}").strip(),
+                "food": match.group("food").strip(),
+                "calories": int(match.group("calories")) if match.group("calories") else None,
+            })
+    return items
+
+
+def build_plan_rows(db, meal_plan: MealPlan, items):
+    """
+    Attach item and per-day rows to MEAL_PLAN and precompute its calorie totals.
+
+    Items without calories are looked up in show_meals by food name.
+    """
+    names = {item["food"].lower() for item in items if item["calories"] is None}
+    known = {}
+    if names:
+        for meal in db.query(ShowMeals).filter(func.lower(ShowMeals.meal_name).in_(names)):
+            known.setdefault(meal.meal_name.lower(), meal)
+
+    day_totals = {}
+    for item in items:
+        show_meal = known.get(item["food"].lower())
+        calories = item["calories"]
+        if calories is None:
+            calories = show_meal.calories if show_meal else 0
+        meal_plan.items.append(MealPlanItem(
+            user_id=meal_plan.user_id,
+            week=meal_plan.week,
+            day_of_week=item["day_of_week"],
+            meal=item["meal"],
+            food=item["food"],
+            calories=calories,
+            show_meal_id=show_meal.id if show_meal else None,
+        ))
+        day_totals[item["day_of_week"]] = day_totals.get(item["day_of_week"], 0) + calories
+
+    for day_of_week, total in sorted(day_totals.items()):
+        meal_plan.days.append(MealPlanDay(
+            user_id=meal_plan.user_id,
+            week=meal_plan.week,
+            day_of_week=day_of_week,
+            total_calories=total,
+        ))
+    meal_plan.total_calories = sum(day_totals.values())
+    return meal_plan
+
+
+def create_structured_plan(db, user_id: int, week: int, plan_details: str):
+    """
+    Create a meal plan with its per-day/per-meal rows. Does not commit.
+
+    Text without any meals under a day marker is kept as a text-only plan
+    (text_only set, no rows), like legacy plans the migration cannot parse.
+    """
+    items = parse_plan_details(plan_details)
+    meal_plan = MealPlan(user_id=user_id, week=week, plan_details=plan_details, text_only=not items)
+    db.add(meal_plan)
+    return build_plan_rows(db, meal_plan, items)
+
+
+def week_dates(week: int, year: int):
+    """
+    Dates of Monday..Sunday of ISO WEEK in YEAR.
+    """
+    monday = date.fromisocalendar(year, week, 1)
+    return [monday + timedelta(days=n) for n in range(7)]
+
+
+def planned_vs_actual(db, user_id: int, week: int, year: int):
+    """
+    Return (day_name, date, planned, actual) for each day of the week.
+    """
+    planned = dict(
+        db.query(MealPlanDay.day_of_week, func.sum(MealPlanDay.total_calories))
+          .filter(MealPlanDay.user_id == user_id, MealPlanDay.week == week)
+          .group_by(MealPlanDay.day_of_week)
+          .all()
+    )
+    dates = week_dates(week, year)
+    actual = dict(
+        db.query(Entry.date, func.sum(Entry.calories))
+          .filter(Entry.user_id == user_id, Entry.date >= dates[0], Entry.date <= dates[-1])
+          .group_by(Entry.date)
+          .all()
+    )
+    return [
+        (DAYS[n], d, planned.get(n, 0), actual.get(d, 0))
+        for n, d in enumerate(dates)
+    ]
+
+
+def migrate_schema(engine):
+    """
+    Bring an existing database up to the current schema.
+
+    Creates the new tables and any missing indexes, and adds
+    meal_plans.total_calories, meal_plans.text_only and users.data_version
+    with its triggers;
+    create_all() does none of this for tables that already exist.
+    """
+    from models import Base, data_version_triggers
+
+    Base.metadata.create_all(bind=engine)
+    columns = {c["name"] for c in inspect(engine).get_columns("meal_plans")}
+    user_columns = {c["name"] for c in inspect(engine).get_columns("users")}
+    with engine.begin() as conn:
+        if "total_calories" not in columns:
+            conn.execute(text(
+                "ALTER TABLE meal_plans ADD COLUMN total_calories INTEGER NOT NULL DEFAULT 0"
+            ))
+        if "text_only" not in columns:
+            conn.execute(text(
+                "ALTER TABLE meal_plans ADD COLUMN text_only BOOLEAN NOT NULL DEFAULT 0"
+            ))
+        if "data_version" not in user_columns:
+            conn.execute(text(
+                "ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"
+            ))
+        for statement in data_version_triggers():
+            conn.exec_driver_sql(statement)
+        # checkfirst cannot see expression indexes (SQLAlchemy does not reflect
+        # them), so compare against the names SQLite itself reports
+        existing = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=conn)
+
+
+def migrate_plan_details(db):
+    """
+    Parse plan_details of meal plans that have no item rows yet.
+
+    Returns (migrated, unparsed) counts. Unparsed plans keep their text, get
+    no rows and are marked text_only, so later runs skip them rather than
+    counting them again.
+    """
+    migrated = unparsed = 0
+    plans = (
+        db.query(MealPlan)
+          .outerjoin(MealPlanItem, MealPlanItem.meal_plan_id == MealPlan.id)
+          .filter(MealPlanItem.id.is_(None), MealPlan.text_only.is_(False))
+          .all()
+    )
+    for meal_plan in plans:
+        items = parse_plan_details(meal_plan.plan_details)
+        if not items:
+            meal_plan.text_only = True
+            unparsed += 1
+            continue
+        build_plan_rows(db, meal_plan, items)
+        migrated += 1
+    db.commit()
+    return migrated, unparsed
@@ -1,68 +0,0 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey
-from sqlalchemy.orm import relationship, declarative_base
-
-Base = declarative_base()
-
-class User(Base):
-    __tablename__ = "users"
-
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=True, index=True, nullable=False)
-
-    # Relationships
-    entries = relationship("Entry", back_populates="user", cascade="all, delete-orphan")
-    goals = relationship("Goal", back_populates="user", cascade="all, delete-orphan")
-    meal_plans = relationship("MealPlan", back_populates="user", cascade="all, delete-orphan")
-    reporting   = relationship("Reporting",back_populates="user",    cascade="all, delete-orphan")
-
-
-
-class Entry(Base):
-    __tablename__ = "entries"
-
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    food = Column(String, nullable=False)
-    calories = Column(Integer, nullable=False)
-    date = Column(Date, nullable=False)
-
-    user = relationship("User", back_populates="entries")
-
-
-class Goal(Base):
-    __tablename__ = "goals"
-
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    daily = Column(Integer, nullable=False)
-    weekly = Column(Integer, nullable=False)
-
-    user = relationship("User", back_populates="goals")
-
-
-class MealPlan(Base):
-    __tablename__ = "meal_plans"
-
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    week = Column(Integer, nullable=False)
-    plan_details = Column(String, nullable=False)  # could be JSON or text
-
-    user = relationship("User", back_populates="meal_plans")
-
-
-class Reporting(Base):
-    __tablename__ = "reporting"
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    report_date = Column(Date, nullable=False)
-    total_calories = Column(Integer, nullable=False)
-    user = relationship("User")
-
-class ShowMeals(Base):
-    __tablename__ = "show_meals"
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    meal_name = Column(String, nullable=False)
-    calories = Column(Integer, nullable=False)
-    
\ No newline at end of file
@@ -1 +1,169 @@
-# This file makes the models directory a Python package
+# This file makes the models directory a Python package; it also holds the ORM models.
+
+from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Index, event, func, inspect
+from sqlalchemy.orm import relationship, declarative_base
+
+Base = declarative_base()
+
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+    # Bumped by the triggers below on every write to the user's rows
+    data_version = Column(Integer, nullable=False, server_default="0")
+
+    # Relationships
+    entries = relationship("Entry", back_populates="user", cascade="all, delete-orphan")
+    goals = relationship("Goal", back_populates="user", cascade="all, delete-orphan")
+    meal_plans = relationship("MealPlan", back_populates="user", cascade="all, delete-orphan")
+    reporting   = relationship("Reporting",back_populates="user",    cascade="all, delete-orphan")
+    show_meals = relationship("ShowMeals", cascade="all, delete-orphan")
+
+
+
+class Entry(Base):
+    __tablename__ = "entries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    food = Column(String, nullable=False)
+    calories = Column(Integer, nullable=False)
+    date = Column(Date, nullable=False, index=True)
+
+    user = relationship("User", back_populates="entries")
+
+    __table_args__ = (
+        Index("ix_entries_user_date", "user_id", "date"),
+    )
+
+
+class Goal(Base):
+    __tablename__ = "goals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    daily = Column(Integer, nullable=False)
+    weekly = Column(Integer, nullable=False)
+
+    user = relationship("User", back_populates="goals")
+
+
+class MealPlan(Base):
+    __tablename__ = "meal_plans"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    week = Column(Integer, nullable=False)
+    plan_details = Column(String, nullable=False)  # original text, parsed into days/items
+    total_calories = Column(Integer, nullable=False, default=0)  # planned kcal for the week
+    text_only = Column(Boolean, nullable=False, server_default="0")  # no day markers, so no rows
+
+    user = relationship("User", back_populates="meal_plans")
+    days = relationship("MealPlanDay", back_populates="meal_plan", cascade="all, delete-orphan")
+    items = relationship("MealPlanItem", back_populates="meal_plan", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_meal_plans_user_week", "user_id", "week"),
+    )
+
+
+class MealPlanDay(Base):
+    __tablename__ = "meal_plan_days"
+
+    id = Column(Integer, primary_key=True, index=True)
+    meal_plan_id = Column(Integer, ForeignKey("meal_plans.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    week = Column(Integer, nullable=False)
+    day_of_week = Column(Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    total_calories = Column(Integer, nullable=False, default=0)
+
+    meal_plan = relationship("MealPlan", back_populates="days")
+
+    __table_args__ = (
+        Index("ix_meal_plan_days_user_week", "user_id", "week", "day_of_week"),
+    )
+
+
+class MealPlanItem(Base):
+    __tablename__ = "meal_plan_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    meal_plan_id = Column(Integer, ForeignKey("meal_plans.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    week = Column(Integer, nullable=False)
+    day_of_week = Column(Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    meal = Column(String, nullable=False)
+    food = Column(String, nullable=False)
+    calories = Column(Integer, nullable=False, default=0)
+    show_meal_id = Column(Integer, ForeignKey("show_meals.id"), nullable=True, index=True)
+
+    meal_plan = relationship("MealPlan", back_populates="items")
+    show_meal = relationship("ShowMeals", back_populates="plan_items")
+
+    __table_args__ = (
+        Index("ix_meal_plan_items_user_week", "user_id", "week", "day_of_week"),
+    )
+
+
+class Reporting(Base):
+    __tablename__ = "reporting"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    report_date = Column(Date, nullable=False)
+    total_calories = Column(Integer, nullable=False)
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_reporting_user_date", "user_id", "report_date"),
+        Index("ix_reporting_date", "report_date"),  # export --since
+    )
+
+class ShowMeals(Base):
+    __tablename__ = "show_meals"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    meal_name = Column(String, nullable=False)
+    calories = Column(Integer, nullable=False)
+
+    # Deleting a meal (with its user) unlinks the plan items that used it
+    plan_items = relationship("MealPlanItem", back_populates="show_meal")
+
+
+# Meal plan items look up calories by case-insensitive food name
+Index("ix_show_meals_meal_name_lower", func.lower(ShowMeals.meal_name))
+
+
+# Tables whose rows belong to a user; any write to them bumps users.data_version
+# in the same transaction, whichever process makes it. api.py builds ETags from it.
+VERSIONED_TABLES = ("entries", "goals", "meal_plans", "meal_plan_days", "meal_plan_items", "reporting")
+
+
+def data_version_triggers():
+    """
+    CREATE TRIGGER statements that keep users.data_version current.
+
+    A new user starts from a random version, so a user id reused after a
+    delete never repeats the ETags of the user it replaced.
+    """
+    bump = "UPDATE users SET data_version = data_version + 1 WHERE id IN ({ids});"
+    statements = [
+        "CREATE TRIGGER IF NOT EXISTS users_insert_data_version AFTER INSERT ON users BEGIN "
+        "UPDATE users SET data_version = abs(random() % 1000000000000) WHERE id = NEW.id; END"
+    ]
+    for table in VERSIONED_TABLES:
+        for op, ids in (("INSERT", "NEW.user_id"), ("UPDATE", "OLD.user_id, NEW.user_id"), ("DELETE", "OLD.user_id")):
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_{op.lower()}_data_version "
+                f"AFTER {op} ON {table} BEGIN {bump.format(ids=ids)} END"
+            )
+    return statements
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_data_version_triggers(target, connection, **kw):
+    # A database from before data_version gets the column and the triggers
+    # from migrate-mealplans instead.
+    if "data_version" in {c["name"] for c in inspect(connection).get_columns("users")}:
+        for statement in data_version_triggers():
+            connection.exec_driver_sql(statement)
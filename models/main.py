@@ -1,8 +1,10 @@
 # main.py
 import typer
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from db import SessionLocal
 from models import User, Entry
+from usercache import user_id_for_name, invalidate_user
 from datetime import date
 
 app = typer.Typer()
@@ -17,6 +19,7 @@ def create_user(name: str):
     db.add(user)
     db.commit()
     db.refresh(user)
+    invalidate_user(user.id, user.name)
     db.close()
     typer.echo(f"User '{name}' created with ID {user.id}")
 
@@ -40,14 +43,21 @@ def add_entry(user_name: str, food: str, calories: int, entry_date: str):
     Add a food entry.
     """
     db: Session = SessionLocal()
-    user = db.query(User).filter(User.name == user_name).first()
-    if not user:
+    user_id = user_id_for_name(db, user_name)
+    if user_id is None:
         typer.echo(f"User '{user_name}' not found!")
         db.close()
         return
-    entry = Entry(user_id=user.id, food=food, calories=calories, date=date.fromisoformat(entry_date))
+    entry = Entry(user_id=user_id, food=food, calories=calories, date=date.fromisoformat(entry_date))
     db.add(entry)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Deleted by another process since the name was cached
+        db.close()
+        invalidate_user(user_id, user_name)
+        typer.echo(f"User '{user_name}' not found!")
+        return
     db.refresh(entry)
     db.close()
     typer.echo(f"Entry '{food}' with {calories} calories added for {entry_date}")
@@ -59,12 +69,12 @@ def list_entries(user_name: str = None):
     """
     db: Session = SessionLocal()
     if user_name:
-        user = db.query(User).filter(User.name == user_name).first()
-        if not user:
+        user_id = user_id_for_name(db, user_name)
+        if user_id is None:
             typer.echo(f"User '{user_name}' not found!")
             db.close()
             return
-        entries = db.query(Entry).filter(Entry.user_id == user.id).all()
+        entries = db.query(Entry).filter(Entry.user_id == user_id).all()
     else:
         entries = db.query(Entry).all()
     db.close()
@@ -1,22 +1,30 @@
 # mealplan.py
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from models import User, MealPlan
+from models import MealPlan
+from usercache import user_id_for_name, invalidate_user
+from mealplans import create_structured_plan
 
 def create_meal_plan(db: Session, user_name: str, week: int, plan_details: str):
-    user = db.query(User).filter(User.name == user_name).first()
-    if not user:
+    user_id = user_id_for_name(db, user_name)
+    if user_id is None:
         return None, f"User '{user_name}' not found."
 
-    meal_plan = MealPlan(user_id=user.id, week=week, plan_details=plan_details)
-    db.add(meal_plan)
-    db.commit()
+    meal_plan = create_structured_plan(db, user_id, week, plan_details)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Deleted by another process since the name was cached
+        db.rollback()
+        invalidate_user(user_id, user_name)
+        return None, f"User '{user_name}' not found."
     db.refresh(meal_plan)
     return meal_plan, None
 
 def list_meal_plans(db: Session, user_name: str):
-    user = db.query(User).filter(User.name == user_name).first()
-    if not user:
+    user_id = user_id_for_name(db, user_name)
+    if user_id is None:
         return None, f"User '{user_name}' not found."
 
-    meal_plans = db.query(MealPlan).filter(MealPlan.user_id == user.id).all()
+    meal_plans = db.query(MealPlan).filter(MealPlan.user_id == user_id).all()
     return meal_plans, None
@@ -0,0 +1,92 @@
+# queries.py
+
+from sqlalchemy import select, insert, delete, func, bindparam
+
+from models import User, Entry, Reporting
+
+# Hot-path statements, built once at import. They are plain Core constructs on
+# the mapped tables, so each call skips building an ORM Query, reuses the
+# compiled SQL from the engine's cache and returns tuples rather than objects.
+users = User.__table__
+entries = Entry.__table__
+reporting = Reporting.__table__
+
+USER_BY_ID = select(users.c.id, users.c.name).where(users.c.id == bindparam("user_id"))
+USER_ID_BY_NAME = select(users.c.id).where(users.c.name == bindparam("name"))
+USER_VERSION = select(users.c.data_version).where(users.c.id == bindparam("user_id"))
+
+DAILY_TOTAL = select(func.coalesce(func.sum(entries.c.calories), 0)).where(
+    entries.c.user_id == bindparam("user_id"),
+    entries.c.date == bindparam("date"),
+)
+INSERT_ENTRY = insert(entries)
+DELETE_ENTRY = delete(entries).where(entries.c.id == bindparam("entry_id")).returning(entries.c.user_id)
+
+REPORT_FOR_DAY = select(reporting.c.id, reporting.c.total_calories).where(
+    reporting.c.user_id == bindparam("user_id"),
+    reporting.c.report_date == bindparam("report_date"),
+)
+INSERT_REPORT = insert(reporting)
+
+
+def user_by_id(db, user_id: int):
+    """
+    Return the (id, name) row for USER_ID, or None.
+    """
+    return db.connection().execute(USER_BY_ID, {"user_id": user_id}).first()
+
+
+def user_id_by_name(db, name: str):
+    """
+    Return the id of the user called NAME, or None.
+    """
+    return db.connection().execute(USER_ID_BY_NAME, {"name": name}).scalar()
+
+
+def user_version(db, user_id: int):
+    """
+    Return the data_version of USER_ID, or None if there is no such user.
+    """
+    return db.connection().execute(USER_VERSION, {"user_id": user_id}).scalar()
+
+
+def daily_total(db, user_id: int, day):
+    """
+    Total calories logged by USER_ID on DAY (0 if nothing was logged).
+    """
+    return db.connection().execute(DAILY_TOTAL, {"user_id": user_id, "date": day}).scalar()
+
+
+def add_entry(db, user_id: int, food: str, calories: int, day):
+    """
+    Insert a food entry and return its id. Does not commit.
+    """
+    result = db.connection().execute(
+        INSERT_ENTRY, {"user_id": user_id, "food": food, "calories": calories, "date": day}
+    )
+    return result.inserted_primary_key[0]
+
+
+def delete_entry(db, entry_id: int):
+    """
+    Delete an entry and return the owning user_id, or None if there was no
+    such entry. Does not commit.
+    """
+    return db.connection().execute(DELETE_ENTRY, {"entry_id": entry_id}).scalar()
+
+
+def report_for_day(db, user_id: int, day):
+    """
+    Return the (id, total_calories) row of the report for USER_ID on DAY, or None.
+    """
+    return db.connection().execute(REPORT_FOR_DAY, {"user_id": user_id, "report_date": day}).first()
+
+
+def add_report(db, user_id: int, day, total_calories: int):
+    """
+    Insert a daily report and return its id. Does not commit.
+    """
+    result = db.connection().execute(
+        INSERT_REPORT, {"user_id": user_id, "report_date": day, "total_calories": total_calories}
+    )
+    return result.inserted_primary_key[0]
@@ -0,0 +1,134 @@
+# querybench.py
+
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import typer
+
+app = typer.Typer(help="Per-operation CPU cost of the hot-path queries")
+
+SEED_USERS = 50
+SEED_ENTRIES_PER_USER = 200
+DAY = date(2024, 1, 1)
+
+
+def seed(db):
+    from models import User, Entry, Reporting
+
+    for i in range(SEED_USERS):
+        user = User(name=f"bench-user-{i}")
+        db.add(user)
+        db.flush()
+        db.add_all(
+            Entry(user_id=user.id, food="Salad", calories=300, date=DAY + timedelta(days=n % 30))
+            for n in range(SEED_ENTRIES_PER_USER)
+        )
+        db.add(Reporting(user_id=user.id, report_date=DAY, total_calories=900))
+    db.commit()
+
+
+def operations():
+    """
+    (name, previous ORM form, queries.py form) for each hot operation, written
+    the way cli.py ran them before the shared query module.
+    """
+    from sqlalchemy import func
+    from models import User, Entry, Reporting
+    import queries
+
+    def orm_add_entry(db, i):
+        entry = Entry(user_id=1 + i % SEED_USERS, food="Apple", calories=90, date=DAY)
+        db.add(entry)
+        db.commit()
+        db.refresh(entry)
+        return entry.id
+
+    def core_add_entry(db, i):
+        entry_id = queries.add_entry(db, 1 + i % SEED_USERS, "Apple", 90, DAY)
+        db.commit()
+        return entry_id
+
+    def orm_create_report(db, i):
+        user_id = 1 + i % SEED_USERS
+        day = DAY + timedelta(days=1 + i)
+        db.query(Reporting).filter(Reporting.user_id == user_id, Reporting.report_date == day).first()
+        total = db.query(func.sum(Entry.calories)).filter(Entry.user_id == user_id, Entry.date == day).scalar()
+        report = Reporting(user_id=user_id, report_date=day, total_calories=total or 0)
+        db.add(report)
+        db.commit()
+        db.refresh(report)
+
+    def core_create_report(db, i):
+        user_id = 1 + i % SEED_USERS
+        day = DAY + timedelta(days=1 + i)
+        queries.report_for_day(db, user_id, day)
+        total = queries.daily_total(db, user_id, day)
+        queries.add_report(db, user_id, day, total)
+        db.commit()
+
+    return [
+        ("user by id",
+         lambda db, i: db.query(User).filter(User.id == 1 + i % SEED_USERS).first(),
+         lambda db, i: queries.user_by_id(db, 1 + i % SEED_USERS)),
+        ("user by name",
+         lambda db, i: db.query(User).filter(User.name == f"bench-user-{i % SEED_USERS}").first(),
+         lambda db, i: queries.user_id_by_name(db, f"bench-user-{i % SEED_USERS}")),
+        ("daily total",
+         lambda db, i: db.query(func.sum(Entry.calories)).filter(
+             Entry.user_id == 1 + i % SEED_USERS, Entry.date == DAY).scalar(),
+         lambda db, i: queries.daily_total(db, 1 + i % SEED_USERS, DAY)),
+        ("report exists",
+         lambda db, i: db.query(Reporting).filter(
+             Reporting.user_id == 1 + i % SEED_USERS, Reporting.report_date == DAY).first(),
+         lambda db, i: queries.report_for_day(db, 1 + i % SEED_USERS, DAY)),
+        ("add entry", orm_add_entry, core_add_entry),
+        ("create report", orm_create_report, core_create_report),
+    ]
+
+
+def cpu_per_op(session_factory, fn, iterations, offset=0):
+    """
+    CPU seconds per call of FN, each call in a fresh session like a CLI command.
+    """
+    start = time.process_time()
+    for i in range(iterations):
+        db = session_factory()
+        fn(db, offset + i)
+        db.close()
+    return (time.process_time() - start) / iterations
+
+
+@app.command()
+def main(
+    iterations: int = typer.Option(2000, "--iterations", "-n", help="Calls per operation and variant"),
+):
+    """
+    Compare CPU per operation of the previous ORM queries against queries.py.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["HEALTH_DB"] = os.path.join(tmp, "querybench.db")
+        from db import engine, read_engine, WriterSession
+        from models import Base
+
+        Base.metadata.create_all(bind=engine)
+        db = WriterSession()
+        seed(db)
+        db.close()
+
+        typer.echo(f"{'operation':<14} {'ORM µs/op':>10} {'Core µs/op':>11} {'saved':>7}")
+        for name, orm_fn, core_fn in operations():
+            # Warm the compiled-statement caches before timing either variant
+            cpu_per_op(WriterSession, orm_fn, 20, offset=10 * iterations)
+            cpu_per_op(WriterSession, core_fn, 20, offset=20 * iterations)
+            orm = cpu_per_op(WriterSession, orm_fn, iterations)
+            core = cpu_per_op(WriterSession, core_fn, iterations, offset=iterations)
+            typer.echo(f"{name:<14} {orm * 1e6:>10.1f} {core * 1e6:>11.1f} {1 - core / orm:>7.0%}")
+
+        engine.dispose()
+        read_engine.dispose()
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,262 @@
+# queryplans.py
+
+import os
+import re
+import json
+import tempfile
+import contextlib
+from datetime import date, timedelta
+
+import typer
+
+app = typer.Typer(help="Check that every command's queries use indexes")
+
+SNAPSHOT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plans.json")
+
+# Tables expected to grow without bound; a full SCAN of any of them is a regression.
+LARGE_TABLES = {
+    "entries", "reporting", "goals", "meal_plans",
+    "meal_plan_days", "meal_plan_items", "show_meals",
+}
+
+SEED_USERS = 20
+SEED_ENTRIES_PER_USER = 50
+SEED_DATE = date(2024, 1, 1)
+
+
+def normalize_sql(statement: str):
+    return re.sub(r"\s+", " ", statement).strip()
+
+
+def scanned_tables(plan):
+    """
+    Tables the plan reads in full, e.g. "SCAN entries" or "SCAN TABLE entries".
+    """
+    tables = set()
+    for detail in plan:
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if match:
+            tables.add(match.group(1))
+    return tables
+
+
+def seed(db):
+    from models import User, Entry, Goal, Reporting, ShowMeals
+    from mealplans import create_structured_plan
+
+    for i in range(SEED_USERS):
+        user = User(name=f"plan-user-{i}")
+        db.add(user)
+        db.flush()
+        db.add_all(
+            Entry(user_id=user.id, food="Salad", calories=300, date=SEED_DATE + timedelta(days=n % 14))
+            for n in range(SEED_ENTRIES_PER_USER)
+        )
+        db.add(Goal(user_id=user.id, daily=2000, weekly=14000))
+        db.add(Reporting(user_id=user.id, report_date=SEED_DATE, total_calories=900))
+        db.add(ShowMeals(user_id=user.id, meal_name=f"Stew {chr(65 + i)}", calories=250))
+        create_structured_plan(db, user.id, 1, "Mon: breakfast=Oatmeal 350; lunch=Stew A  Tue: dinner=Pasta 700")
+    db.commit()
+
+
+def command_cases():
+    """
+    (name, callable, tables allowed to be scanned) for each command, service
+    function and lookup.
+    """
+    import cli
+    import models.main
+    import models.mealplan
+    from db import SessionLocal, reader_session
+    from export import TABLES, _build_query
+    from usercache import user_cache
+
+    def lookup(fn, *args):
+        def run():
+            user_cache.clear()
+            db = SessionLocal()
+            try:
+                fn(db, *args)
+            finally:
+                db.close()
+        return run
+
+    def export_queries(partition_by, tables=tuple(TABLES), after_id=None, since=None):
+        # export_table runs this statement on a raw DBAPI cursor, which the
+        # capture hook does not see, so run the same statement through a session.
+        def run():
+            db = reader_session()
+            try:
+                for table in tables:
+                    db.execute(_build_query(table, partition_by, after_id, since)).close()
+            finally:
+                db.close()
+        return run
+
+    day = SEED_DATE.isoformat()
+    return [
+        ("list-users", lambda: cli.list_users(), {"users"}),
+        ("list-entries", lambda: cli.list_entries(user_id=None, date=None), {"entries"}),
+        ("list-entries --user-id", lambda: cli.list_entries(user_id=2, date=None), set()),
+        ("list-entries --date", lambda: cli.list_entries(user_id=None, date=day), set()),
+        ("list-entries --user-id --date", lambda: cli.list_entries(user_id=2, date=day), set()),
+        ("add-entry", lambda: cli.add_entry(3, "Apple", 90, day), set()),
+        ("delete-entry", lambda: cli.delete_entry(1), set()),
+        ("create-report", lambda: cli.create_report(user_id=3, date="2024-01-02"), set()),
+        ("create-report existing", lambda: cli.create_report(user_id=3, date=day), set()),
+        ("create-goal", lambda: cli.create_goal(4, 1800, 12600), set()),
+        ("add-meal-plan", lambda: cli.add_meal_plan(4, 2, "Wed: lunch=Stew D; dinner=Rice 300"), set()),
+        ("show-mealplan", lambda: cli.show_mealplan(user_id=5, week=1), set()),
+        ("compare-mealplan", lambda: cli.compare_mealplan(user_id=5, week=1, year=2024), set()),
+        ("create-user", lambda: cli.create_user("plan-new-user"), set()),
+        ("delete-user", lambda: cli.delete_user(6), set()),
+        ("delete-goal", lambda: cli.delete_goal(8), set()),
+        ("delete-meal-plan", lambda: cli.delete_meal_plan(8), set()),
+        ("delete-report", lambda: cli.delete_report(8), set()),
+        # A one-off pass over every plan without rows
+        ("migrate-mealplans", lambda: cli.migrate_mealplans(), {"meal_plans"}),
+        ("export", export_queries("none"), set(TABLES)),
+        ("export --partition-by user", export_queries("user"), set(TABLES)),
+        ("export --partition-by month", export_queries("month", tables=("entries", "reporting")),
+         {"entries", "reporting"}),
+        ("export --table entries --after-id",
+         export_queries("none", tables=("entries",), after_id=SEED_ENTRIES_PER_USER * 10), set()),
+        ("export --since", export_queries("none", since=SEED_DATE + timedelta(days=7)), {"goals", "meal_plans"}),
+        ("main add_entry", lambda: models.main.add_entry("plan-user-9", "Apple", 90, day), set()),
+        ("main list_entries", lambda: models.main.list_entries("plan-user-9"), set()),
+        ("main list_entries all", lambda: models.main.list_entries(), {"entries"}),
+        ("mealplan create_meal_plan",
+         lookup(models.mealplan.create_meal_plan, "plan-user-10", 3, "Thu: lunch=Stew K"), set()),
+        ("mealplan list_meal_plans", lookup(models.mealplan.list_meal_plans, "plan-user-10"), set()),
+        ("user_id_for_name", lookup(user_cache.user_id_for_name, "plan-user-7"), set()),
+        ("user_exists", lookup(user_cache.user_exists, 7), set()),
+    ]
+
+
+def capture_plans():
+    """
+    Run every case against a seeded scratch database and return
+    {case: [{"sql": ..., "plan": [...]}]} plus {case: allowed scans}.
+    """
+    from sqlalchemy import event
+    from db import engine, read_engine, WriterSession
+    from models import Base
+    from usercache import user_cache
+
+    Base.metadata.create_all(bind=engine)
+    db = WriterSession()
+    seed(db)
+    db.close()
+
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if re.match(r"\s*(SELECT|UPDATE|DELETE)\b", statement, re.IGNORECASE):
+            if executemany:
+                parameters = parameters[0]
+            captured.append((statement, parameters))
+
+    for eng in (engine, read_engine):
+        event.listen(eng, "before_cursor_execute", record)
+
+    plans, allowed = {}, {}
+    raw = engine.raw_connection()
+    try:
+        for name, run, allow_scan in command_cases():
+            user_cache.clear()
+            captured.clear()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                try:
+                    run()
+                except typer.Exit:
+                    pass
+            queries = []
+            for statement, parameters in captured:
+                rows = raw.cursor().execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+                queries.append({"sql": normalize_sql(statement), "plan": [row[-1] for row in rows]})
+            plans[name] = queries
+            allowed[name] = allow_scan
+    finally:
+        raw.close()
+        for eng in (engine, read_engine):
+            event.remove(eng, "before_cursor_execute", record)
+    return plans, allowed
+
+
+def find_problems(plans, allowed, snapshot):
+    """
+    Return a list of human-readable failures.
+    """
+    problems = []
+    for name, queries in plans.items():
+        for query in queries:
+            scans = (scanned_tables(query["plan"]) & LARGE_TABLES) - allowed[name]
+            if scans:
+                problems.append(
+                    f"{name}: full scan of {', '.join(sorted(scans))}\n"
+                    f"    {query['sql']}\n    plan: {query['plan']}"
+                )
+        if snapshot is None:
+            continue
+        if name not in snapshot:
+            problems.append(f"{name}: no approved plan snapshot (run with --update)")
+            continue
+        approved = [q["plan"] for q in snapshot[name]]
+        current = [q["plan"] for q in queries]
+        if approved != current:
+            problems.append(
+                f"{name}: query plans differ from the approved snapshot\n"
+                f"    approved: {approved}\n    current:  {current}"
+            )
+    return problems
+
+
+@app.command()
+def main(
+    update: bool = typer.Option(False, "--update", help="Approve the current plans and rewrite the snapshot"),
+    snapshot_file: str = typer.Option(SNAPSHOT_FILE, "--snapshot", help="Approved plan snapshot (JSON)"),
+):
+    """
+    Run every command against a seeded scratch database, EXPLAIN QUERY PLAN each
+    query and fail on full scans of large tables or plans that changed.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["HEALTH_DB"] = os.path.join(tmp, "queryplans.db")
+        plans, allowed = capture_plans()
+        from db import engine, read_engine
+        engine.dispose()
+        read_engine.dispose()
+
+    snapshot = None
+    if not update:
+        if os.path.exists(snapshot_file):
+            with open(snapshot_file) as f:
+                snapshot = json.load(f)
+        else:
+            typer.echo(f"⚠️  No snapshot at {snapshot_file}; only checking for scans.")
+
+    problems = find_problems(plans, allowed, snapshot)
+    for name, queries in plans.items():
+        failed = any(p.startswith(name + ":") for p in problems)
+        typer.echo(f"{'❌' if failed else '✅'} {name} ({len(queries)} queries)")
+    for problem in problems:
+        typer.echo(problem)
+
+    if update:
+        scan_problems = find_problems(plans, allowed, None)
+        if scan_problems:
+            typer.echo("❌ Not updating the snapshot while queries scan large tables.")
+            raise typer.Exit(code=1)
+        with open(snapshot_file, "w") as f:
+            json.dump(plans, f, indent=2, sort_keys=True)
+            f.write("\n")
+        typer.echo(f"✅ Snapshot written to {snapshot_file}")
+        return
+
+    if problems:
+        raise typer.Exit(code=1)
+    typer.echo("✅ All query plans use indexes and match the snapshot.")
+
+
+if __name__ == "__main__":
+    app()
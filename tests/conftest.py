@@ -0,0 +1,38 @@
+# conftest.py
+
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# db.py opens HEALTH_DB when it is first imported, so point it at a scratch
+# file before any test module imports the app.
+SCRATCH_DIR = tempfile.mkdtemp(prefix="health-tests-")
+os.environ["HEALTH_DB"] = os.path.join(SCRATCH_DIR, "health.db")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def fresh_db():
+    """
+    Empty tables (ids start again at 1) and an empty user cache.
+    """
+    from db import engine, read_engine
+    from models import Base
+    from usercache import user_cache
+
+    engine.dispose()
+    read_engine.dispose()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    yield
+    user_cache.clear()
@@ -0,0 +1,135 @@
+# test_api.py
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import cli
+
+DAY = "2024-01-01"
+
+
+@pytest.fixture
+def client(fresh_db):
+    with TestClient(api.app) as client:
+        yield client
+
+
+def create_user(client, name="ann"):
+    response = client.post("/users", json={"name": name})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def add_entry(client, user_id, calories=300, day=DAY):
+    response = client.post("/entries", json={"user_id": user_id, "food": "Salad", "calories": calories, "date": day})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_unchanged_resource_answers_304(client):
+    user_id = create_user(client)
+    add_entry(client, user_id)
+    first = client.get(f"/users/{user_id}/totals/{DAY}")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = client.get(f"/users/{user_id}/totals/{DAY}", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+
+@pytest.mark.parametrize("header", [
+    lambda etag: etag.removeprefix("W/"),
+    lambda etag: f'"other", {etag}',
+    lambda etag: "*",
+])
+def test_if_none_match_uses_weak_comparison(client, header):
+    user_id = create_user(client)
+    etag = client.get(f"/users/{user_id}/goals").headers["etag"]
+    response = client.get(f"/users/{user_id}/goals", headers={"If-None-Match": header(etag)})
+    assert response.status_code == 304
+
+
+def test_api_write_changes_etag(client):
+    user_id = create_user(client)
+    first = client.get(f"/users/{user_id}/totals/{DAY}")
+    add_entry(client, user_id, calories=450)
+
+    after = client.get(f"/users/{user_id}/totals/{DAY}", headers={"If-None-Match": first.headers["etag"]})
+    assert after.status_code == 200
+    assert after.headers["etag"] != first.headers["etag"]
+    assert after.json()["total_calories"] == 450
+
+
+def test_cli_write_changes_etag(client):
+    user_id = create_user(client)
+    first = client.get(f"/users/{user_id}/totals/{DAY}")
+    cli.add_entry(user_id, "Soup", 200, DAY)
+
+    after = client.get(f"/users/{user_id}/totals/{DAY}", headers={"If-None-Match": first.headers["etag"]})
+    assert after.status_code == 200
+    assert after.json()["total_calories"] == 200
+
+
+def test_other_users_writes_keep_etag(client):
+    user_id = create_user(client)
+    other_id = create_user(client, "bob")
+    etag = client.get(f"/users/{user_id}/totals/{DAY}").headers["etag"]
+    add_entry(client, other_id)
+
+    response = client.get(f"/users/{user_id}/totals/{DAY}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_entries_pages_follow_next_after_id(client):
+    user_id = create_user(client)
+    ids = [add_entry(client, user_id) for _ in range(5)]
+
+    seen, pages, after_id = [], 0, 0
+    while after_id is not None:
+        page = client.get("/entries", params={"user_id": user_id, "after_id": after_id, "limit": 2}).json()
+        seen += [entry["id"] for entry in page["entries"]]
+        after_id = page["next_after_id"]
+        pages += 1
+    assert seen == ids
+    assert pages == 3
+
+
+def test_last_full_page_is_followed_by_an_empty_one(client):
+    user_id = create_user(client)
+    ids = [add_entry(client, user_id) for _ in range(2)]
+
+    page = client.get("/entries", params={"limit": 2}).json()
+    assert page["next_after_id"] == ids[-1]
+    page = client.get("/entries", params={"after_id": ids[-1], "limit": 2}).json()
+    assert page == {"entries": [], "next_after_id": None}
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("GET", f"/users/999/totals/{DAY}", None),
+    ("GET", "/users/999/goals", None),
+    ("GET", "/users/999/reports", None),
+    ("GET", "/users/999/mealplans/1", None),
+    ("POST", "/entries", {"user_id": 999, "food": "Salad", "calories": 300, "date": DAY}),
+    ("POST", "/goals", {"user_id": 999, "daily": 2000, "weekly": 14000}),
+    ("DELETE", "/entries/999", None),
+    ("DELETE", "/users/999", None),
+])
+def test_missing_rows_answer_404(client, method, path, body):
+    assert client.request(method, path, json=body).status_code == 404
+
+
+def test_week_without_plan_answers_404(client):
+    user_id = create_user(client)
+    assert client.get(f"/users/{user_id}/mealplans/1").status_code == 404
+
+
+def test_text_only_plan_is_returned_as_text(client):
+    user_id = create_user(client)
+    response = client.post("/mealplans", json={"user_id": user_id, "week": 1, "plan_details": "more greens"})
+    assert response.status_code == 201
+    assert response.json()["text_only"] is True
+
+    plan = client.get(f"/users/{user_id}/mealplans/1").json()
+    assert plan["plan_details"] == ["more greens"]
@@ -0,0 +1,12 @@
+# test_query_plans.py
+
+import json
+
+import queryplans
+
+
+def test_query_plans_use_indexes_and_match_snapshot(fresh_db):
+    plans, allowed = queryplans.capture_plans()
+    with open(queryplans.SNAPSHOT_FILE) as f:
+        snapshot = json.load(f)
+    assert queryplans.find_problems(plans, allowed, snapshot) == []
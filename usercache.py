@@ -0,0 +1,119 @@
+# usercache.py
+
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+import queries
+
+# Upper bound on cached lookups; each user takes at most two slots (id and name).
+MAX_CACHED_LOOKUPS = 1024
+
+# bypassed counts cached=False lookups, which always go to the database
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "bypassed", "maxsize", "currsize"])
+
+
+class UserLookupCache:
+    """
+    Bounded LRU cache of user id <-> name lookups.
+
+    Only users that exist are cached; a miss always goes to the database,
+    so a freshly created user is never reported as missing. Nothing tells
+    this process about users deleted by another one. Writes are still safe:
+    the writer enforces foreign keys, so an insert for such a user fails with
+    IntegrityError, and callers turn that into their "No user" error and
+    invalidate the entry. Lookups that must not trust the cache, like the
+    duplicate-name check in create-user, pass cached=False.
+    """
+
+    def __init__(self, maxsize=MAX_CACHED_LOOKUPS):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def _bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def _put(self, user_id, name):
+        with self._lock:
+            for key, value in ((("id", user_id), name), (("name", name), user_id)):
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def user_id_for_name(self, db, name, cached=True):
+        """
+        Return the id of the user called NAME, or None if there is no such user.
+        """
+        if cached:
+            user_id = self._get(("name", name))
+            if user_id is not None:
+                return user_id
+        else:
+            self._bypass()
+        user_id = queries.user_id_by_name(db, name)
+        if user_id is None:
+            self.invalidate(name=name)
+            return None
+        self._put(user_id, name)
+        return user_id
+
+    def user_exists(self, db, user_id, cached=True):
+        """
+        Return True if a user with USER_ID exists.
+        """
+        if not cached:
+            self._bypass()
+        elif self._get(("id", user_id)) is not None:
+            return True
+        row = queries.user_by_id(db, user_id)
+        if not row:
+            self.invalidate(user_id=user_id)
+            return False
+        self._put(row.id, row.name)
+        return True
+
+    def invalidate(self, user_id=None, name=None):
+        """
+        Drop cached lookups for a user. Call after creating or deleting users.
+        """
+        with self._lock:
+            if user_id is not None:
+                name = self._data.pop(("id", user_id), name)
+            if name is not None:
+                cached_id = self._data.pop(("name", name), None)
+                if cached_id is not None:
+                    self._data.pop(("id", cached_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.bypassed = 0
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.bypassed, self.maxsize, len(self._data))
+
+
+# Shared by cli.py and the name-based helpers in models/
+user_cache = UserLookupCache()
+
+user_id_for_name = user_cache.user_id_for_name
+user_exists = user_cache.user_exists
+invalidate_user = user_cache.invalidate
+cache_info = user_cache.cache_info